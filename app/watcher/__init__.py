@@ -1,128 +1,454 @@
-import json
+import asyncio
 import logging
+import math
+from collections import OrderedDict
+import cysimdjson
+import httpx
+import numpy as np
+from numba import njit
+import orjson
 import websockets
-from solders.rpc.responses import GetTransactionResp
 from solders.transaction_status import UiTransactionStatusMeta
-from solders.signature import Signature
 from solders.pubkey import Pubkey
-from solders.rpc.api import Client
 
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, NamedTuple, Optional, Set, Union
 
 logging.basicConfig(level=logging.INFO)
+_LOG = logging.getLogger(__name__)
 
 LAMPORTS_PER_SOL = 1_000_000_000
 
-__all__ = ["extract_sol_changes", "monitor_solana"]
+_INT64_MAX = int(np.iinfo(np.int64).max)
 
-def extract_sol_changes(meta: UiTransactionStatusMeta, account_keys: List[Pubkey]) -> List[Dict]:
-    """Return SOL balance changes for each account in a transaction.
+_RPC_URL = "https://api.mainnet-beta.solana.com"
+_WS_URL = "wss://api.mainnet-beta.solana.com"
+
+# Number of concurrent ``getTransaction`` batches, the maximum number of
+# signatures per batch and how many signatures may wait for a free worker
+# before the WebSocket reader is paused.
+_RPC_WORKERS = 8
+_RPC_BATCH_SIZE = 20
+_SIGNATURE_QUEUE_SIZE = 256
+
+# Maximum number of buffered WebSocket frames handled before yielding to the
+# RPC workers.
+_RECV_BATCH_SIZE = 64
+_WS_MAX_QUEUE = 1024
+
+_RPC_TIMEOUT = 10.0
+_RPC_KEEPALIVE_CONNECTIONS = 32
+
+# Sent as text: JSON-RPC over WebSocket expects text frames, and websockets
+# sends ``bytes`` as a binary frame.
+_SUBSCRIBE_FRAME = orjson.dumps({
+    "jsonrpc": "2.0",
+    "id": 1,
+    "method": "logsSubscribe",
+    "params": ["all", {"commitment": "finalized"}]
+}).decode()
+
+# JSON pointers into a ``logsNotification`` frame.
+_SIGNATURE_POINTER = "/params/result/value/signature"
+_ERR_POINTER = "/params/result/value/err"
+
+_parser = cysimdjson.JSONParser()
+
+# Recently fetched signatures, oldest first. Notifications repeated by the node
+# (or by a new subscription after a reconnect) are dropped before any RPC call.
+# Signatures whose fetch failed are not recorded, so they can be retried.
+_SEEN_MAX = 8192
+_seen_signatures: "OrderedDict[str, None]" = OrderedDict()
+
+__all__ = ["SolChange", "extract_sol_changes", "monitor_solana"]
+
+
+class SolChange(NamedTuple):
+    """SOL balance change of a single account in a transaction.
+
+    Attributes:
+        account: base58 account string
+        delta_lamports: change in lamports
+        delta_SOL: change in SOL
+        direction: ``"gain"`` or ``"loss"``
+        reason: text description of the change
+    """
+
+    account: str
+    delta_lamports: int
+    delta_SOL: float
+    direction: str
+    reason: str
+
+
+class _RpcMeta(NamedTuple):
+    """The parts of a raw ``getTransaction`` meta object used by :func:`extract_sol_changes`."""
+
+    pre_balances: np.ndarray
+    post_balances: np.ndarray
+    fee: int
+
+    @classmethod
+    def from_json(cls, meta: Dict) -> "_RpcMeta":
+        """Build from the ``meta`` of a raw ``getTransaction`` result, converting
+        the balances to int64 arrays that the delta kernel can use directly.
+        """
+        return cls(
+            pre_balances=np.array(meta["preBalances"], dtype=np.int64),
+            post_balances=np.array(meta["postBalances"], dtype=np.int64),
+            fee=meta["fee"],
+        )
+
+
+def _rpc_account_keys(tx: Dict) -> List[str]:
+    """Return the account keys of a raw ``getTransaction`` result in balance order.
+
+    Versioned transactions list the accounts loaded from lookup tables in the meta,
+    after the static keys of the message.
+    """
+    keys = tx["transaction"]["message"]["accountKeys"]
+    loaded = tx["meta"].get("loadedAddresses")
+    if loaded:
+        keys = keys + loaded["writable"] + loaded["readonly"]
+    return keys
+
+
+async def _recv_batch(ws) -> List[Union[str, bytes]]:
+    """Wait for the next WebSocket frame and return it with the frames already
+    received behind it, up to ``_RECV_BATCH_SIZE`` in total.
+    """
+    frames = [await ws.recv()]
+    while len(frames) < _RECV_BATCH_SIZE:
+        try:
+            # A zero timeout only lets recv() through when a frame is already
+            # buffered; cancelling recv() does not drop any data.
+            async with asyncio.timeout(0):
+                frames.append(await ws.recv())
+        except TimeoutError:
+            break
+    return frames
+
+
+async def _get_transactions(http: httpx.AsyncClient, signatures: List[str]) -> List[Optional[Dict]]:
+    """Fetch several transactions with one JSON-RPC batch request.
+
+    Args:
+        http: Client for the RPC node, used to post the request.
+        signatures: Base58 signatures of the transactions to fetch.
+
+    Returns:
+        The ``getTransaction`` result for each signature, in the same order, or
+        ``None`` where the node has no such transaction or reported an error.
+    """
+    payload = [
+        {
+            "jsonrpc": "2.0",
+            "id": i,
+            "method": "getTransaction",
+            "params": [sig, {"encoding": "json", "maxSupportedTransactionVersion": 0}]
+        }
+        for i, sig in enumerate(signatures)
+    ]
+    resp = await http.post(
+        "/",
+        content=orjson.dumps(payload),
+        headers={"Content-Type": "application/json"}
+    )
+    resp.raise_for_status()
+
+    body = orjson.loads(resp.content)
+    if isinstance(body, dict):
+        # The node rejected the whole batch (e.g. rate limiting).
+        raise ValueError(f"RPC batch failed: {body.get('error')}")
+    if not isinstance(body, list):
+        raise ValueError(f"Unexpected RPC batch response: {body!r}")
+
+    results: List[Optional[Dict]] = [None] * len(signatures)
+    for item in body:
+        if not isinstance(item, dict):
+            _LOG.error("Unexpected getTransaction response: %r", item)
+            continue
+        if "error" in item:
+            _LOG.error("getTransaction failed: %s", item["error"])
+            continue
+        i = item.get("id")
+        if type(i) is not int or not 0 <= i < len(results):
+            _LOG.error("getTransaction response with unknown id: %r", i)
+            continue
+        results[i] = item.get("result")
+    return results
+
+
+# The explicit signature compiles the kernel at import time (or loads it from
+# the on-disk cache) instead of inside an RPC worker on the first transaction,
+# which would stall the event loop.
+@njit("(int64[:], int64[:], int64, int64)", cache=True)
+def _compute_deltas(pre, post, fee, min_lamports):
+    """Compiled kernel of :func:`_balance_changes`.
+
+    Returns the indices of the accounts whose balance changed by at least
+    ``min_lamports`` (and by at least one lamport), their deltas, and whether
+    each change is the fee paid by the fee payer or a loss.
+    """
+    n = min(pre.shape[0], post.shape[0])
+    threshold = max(min_lamports, 1)
+    idx = np.empty(n, dtype=np.int64)
+    deltas = np.empty(n, dtype=np.int64)
+
+    count = 0
+    for i in range(n):
+        delta = post[i] - pre[i]
+        if abs(delta) >= threshold:
+            idx[count] = i
+            deltas[count] = delta
+            count += 1
+
+    idx = idx[:count]
+    deltas = deltas[:count]
+    return idx, deltas, (idx == 0) & (deltas == -fee), deltas < 0
+
+
+def _balance_changes(meta: UiTransactionStatusMeta, min_lamports: int = 0) -> Dict[str, np.ndarray]:
+    """Return the accounts whose balance changed as aligned arrays.
 
     Args:
         meta: The transaction meta object returned by the RPC API.
-        account_keys: Ordered list of public keys for the transaction accounts.
+        min_lamports: Minimum absolute change, in lamports, for an account to be
+            included.
 
     Returns:
-        A list where each entry describes the SOL change for an account with the
-        following keys:
-            - ``account``: base58 account string
+        A dict of equal-length arrays, one entry per changed account:
+            - ``index``: position of the account in the transaction
             - ``delta_lamports``: change in lamports
-            - ``delta_SOL``: change in SOL
-            - ``direction``: ``"gain"`` or ``"loss"``
-            - ``reason``: text description of the change
+            - ``is_loss``: whether the balance went down
+            - ``is_fee``: whether the change is exactly the fee paid by the fee payer
     """
-    pre = meta.pre_balances
-    post = meta.post_balances
-    fee = meta.fee
+    # Each balance list is read from ``meta`` exactly once: on solders objects
+    # every attribute access converts the whole Rust vector again. Arrays that
+    # are already int64 are passed through without a copy.
+    idx, deltas, is_fee, is_loss = _compute_deltas(
+        np.asarray(meta.pre_balances, dtype=np.int64),
+        np.asarray(meta.post_balances, dtype=np.int64),
+        meta.fee,
+        min_lamports
+    )
+
+    return {
+        "index": idx,
+        "delta_lamports": deltas,
+        "is_loss": is_loss,
+        "is_fee": is_fee,
+    }
+
+
+def _to_sol_changes(
+    changes: Dict[str, np.ndarray], account_keys: List[Union[Pubkey, str]]
+) -> List[SolChange]:
+    """Build :class:`SolChange` rows from the arrays of :func:`_balance_changes`."""
+    sol_deltas = changes["delta_lamports"] / LAMPORTS_PER_SOL
 
     result = []
 
-    for i, (before, after) in enumerate(zip(pre, post)):
-        if before != after:
-            delta = after - before
-            sol_delta = delta / LAMPORTS_PER_SOL
-            direction = "gain" if delta > 0 else "loss"
-
-            reason = "received SOL"
-            if i == 0 and delta < 0 and abs(delta) == fee:
-                reason = "fee"
-            elif delta < 0:
-                reason = "sent SOL or fee"
-
-            result.append({
-                "account": str(account_keys[i]),
-                "delta_lamports": delta,
-                "delta_SOL": sol_delta,
-                "direction": direction,
-                "reason": reason
-            })
+    for i, delta, sol_delta, loss, paid_fee in zip(
+        changes["index"].tolist(),
+        changes["delta_lamports"].tolist(),
+        sol_deltas.tolist(),
+        changes["is_loss"].tolist(),
+        changes["is_fee"].tolist()
+    ):
+        reason = "received SOL"
+        if paid_fee:
+            reason = "fee"
+        elif loss:
+            reason = "sent SOL or fee"
+
+        result.append(SolChange(
+            account=str(account_keys[i]),
+            delta_lamports=delta,
+            delta_SOL=sol_delta,
+            direction="loss" if loss else "gain",
+            reason=reason
+        ))
 
     return result
 
 
-async def monitor_solana(max_events: int = 10, threshold_SOL: float = 0.0) -> List[Dict]:
+def extract_sol_changes(
+    meta: UiTransactionStatusMeta,
+    account_keys: List[Union[Pubkey, str]],
+    min_lamports: int = 0
+) -> List[SolChange]:
+    """Return SOL balance changes for each account in a transaction.
+
+    Args:
+        meta: The transaction meta object returned by the RPC API.
+        account_keys: Ordered list of public keys (``Pubkey`` or base58 strings)
+            for the transaction accounts.
+        min_lamports: Minimum absolute change, in lamports, for an account to be
+            included. Smaller changes are dropped before any SOL amount is computed.
+
+    Returns:
+        A :class:`SolChange` for every account whose balance changed by at least
+        ``min_lamports``.
+    """
+    changes = _balance_changes(meta, min_lamports)
+    if not len(changes["index"]):
+        return []
+    return _to_sol_changes(changes, account_keys)
+
+
+async def monitor_solana(
+    max_events: int = 10, threshold_SOL: float = 0.0, skip_failed: bool = False
+) -> AsyncIterator[SolChange]:
     """
-    Connects to Solana WebSocket, listens to finalized transaction logs, and returns
-    a list of SOL balance changes above the threshold.
+    Connects to Solana WebSocket, listens to finalized transaction logs, and yields
+    SOL balance changes above the threshold as they are found.
+
+    Signatures read from the WebSocket are queued and fetched by a pool of
+    ``_RPC_WORKERS`` tasks, so several ``getTransaction`` round-trips are in
+    flight at once and the socket keeps being drained while they are pending.
+    Each worker sends up to ``_RPC_BATCH_SIZE`` queued signatures in a single
+    JSON-RPC batch request. Workers pause when the caller stops consuming.
+    The tasks and connections are only released once the generator finishes
+    or is closed with ``aclose()``, so callers that may stop early should wrap
+    it in :func:`contextlib.aclosing`.
 
     Args:
         max_events: Maximum number of qualifying events to collect.
         threshold_SOL: Minimum delta_SOL to include in the result (absolute value).
+        skip_failed: Skip failed transactions, as reported by the ``err`` field
+            of the notification, without an RPC request. Their only SOL
+            movement is the fee paid by the fee payer, which is then not
+            reported.
 
-    Returns:
-        A list of dicts with account, delta_SOL, and reason.
+    Yields:
+        A :class:`SolChange` for every qualifying account, grouped by transaction.
     """
-    client = Client("https://api.mainnet-beta.solana.com")
-    url = "wss://api.mainnet-beta.solana.com"
-    sol_changes_accum: List[Dict] = []
+    # The delta kernel works on int64. Non-finite thresholds keep the outcome of
+    # a float comparison: NaN and +inf match nothing, -inf matches everything.
+    if math.isfinite(threshold_SOL):
+        threshold_lamports = max(0, min(round(threshold_SOL * LAMPORTS_PER_SOL), _INT64_MAX))
+    else:
+        threshold_lamports = 0 if threshold_SOL < 0 else _INT64_MAX
+    signatures: "asyncio.Queue[str]" = asyncio.Queue(maxsize=_SIGNATURE_QUEUE_SIZE)
+    results: "asyncio.Queue[List[SolChange]]" = asyncio.Queue(maxsize=_RPC_WORKERS)
+    # Signatures queued or being fetched by this call; they only move to
+    # ``_seen_signatures`` once their transaction has been fetched.
+    pending: Set[str] = set()
 
-    async with websockets.connect(url) as ws:
-        req = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "logsSubscribe",
-            "params": ["all", {"commitment": "finalized"}]
-        }
-        await ws.send(json.dumps(req))
-        logging.info("Connected to Solana WebSocket")
+    async def read_signatures(ws) -> None:
+        while True:
+            new_signatures = []
+
+            for msg in await _recv_batch(ws):
+                try:
+                    if isinstance(msg, str):
+                        msg = msg.encode()
+                    element = _parser.parse(msg)
+                    sig_str = element.at_pointer(_SIGNATURE_POINTER)
+                    if skip_failed and element.at_pointer(_ERR_POINTER) is not None:
+                        continue
+                    if sig_str in _seen_signatures:
+                        _seen_signatures.move_to_end(sig_str)
+                        continue
+                    if sig_str in pending:
+                        continue
+                    pending.add(sig_str)
+                except (KeyError, ValueError, TypeError) as e:
+                    _LOG.error("Unexpected notification: %s", e)
+                    continue
 
-        count = 0
-        while count < max_events:
-            msg = await ws.recv()
-            data = json.loads(msg)
+                new_signatures.append(sig_str)
+
+            # Let the RPC workers run between bursts instead of parsing the
+            # whole backlog first.
+            await asyncio.sleep(0)
+            for sig_str in new_signatures:
+                await signatures.put(sig_str)
+
+    async def fetch_transactions(http: httpx.AsyncClient) -> None:
+        while True:
+            batch = [await signatures.get()]
+            while len(batch) < _RPC_BATCH_SIZE and not signatures.empty():
+                batch.append(signatures.get_nowait())
 
             try:
-                log_entry = data["params"]["result"]
-                sig_str = log_entry["value"]["signature"]
-                sig = Signature.from_string(sig_str)
-
-                tx_resp: GetTransactionResp = client.get_transaction(
-                    sig,
-                    encoding="json",
-                    max_supported_transaction_version=0
-                )
-                tx = tx_resp.value
+                transactions = await _get_transactions(http, batch)
+            except (httpx.HTTPError, KeyError, ValueError, TypeError):
+                _LOG.error("getTransaction batch failed", exc_info=True)
+                pending.difference_update(batch)
+                continue
+
+            for sig_str, tx in zip(batch, transactions):
+                pending.discard(sig_str)
                 if tx is None:
                     continue
 
-                meta = tx.transaction.meta
-                account_keys = tx.transaction.transaction.message.account_keys
-                changes = extract_sol_changes(meta, account_keys)
+                _seen_signatures[sig_str] = None
+                if len(_seen_signatures) > _SEEN_MAX:
+                    _seen_signatures.popitem(last=False)
+
+                try:
+                    meta = _RpcMeta.from_json(tx["meta"])
+                    filtered = extract_sol_changes(meta, _rpc_account_keys(tx), threshold_lamports)
+                except (KeyError, IndexError, TypeError, ValueError):
+                    _LOG.error("Malformed transaction", exc_info=True)
+                    continue
 
-                filtered = [c for c in changes if abs(c["delta_SOL"]) >= threshold_SOL]
                 if filtered:
-                    for ch in filtered:
-                        logging.info(
-                            f"{ch['account']}: {ch['direction']} {abs(ch['delta_SOL']):.9f} SOL ({ch['reason']})"
-                        )
-                    sol_changes_accum.extend(filtered)
-                    count += 1
-
-            except Exception as e:
-                logging.error(f"Error: {e}")
-                continue
+                    await results.put(filtered)
 
-    return sol_changes_accum
+    # One client for every worker: connections are kept alive between batches
+    # and HTTP/2 multiplexes concurrent batches over the same socket, so the TLS
+    # handshake is paid once per run rather than once per request.
+    http = httpx.AsyncClient(
+        base_url=_RPC_URL,
+        http2=True,
+        timeout=_RPC_TIMEOUT,
+        limits=httpx.Limits(max_keepalive_connections=_RPC_KEEPALIVE_CONNECTIONS)
+    )
+    # Notifications are small and arrive constantly, so per-frame deflate costs
+    # more CPU than it saves bandwidth. A deeper receive queue absorbs bursts
+    # while the reader is yielding to the RPC workers.
+    ws_connect = websockets.connect(
+        _WS_URL,
+        compression=None,
+        max_size=None,
+        max_queue=_WS_MAX_QUEUE
+    )
+    async with http, ws_connect as ws:
+        await ws.send(_SUBSCRIBE_FRAME)
+        _LOG.info("Connected to Solana WebSocket")
 
+        if max_events <= 0:
+            return
 
+        reader = asyncio.create_task(read_signatures(ws))
+        workers = [asyncio.create_task(fetch_transactions(http)) for _ in range(_RPC_WORKERS)]
+        tasks = [reader, *workers]
+        next_result: Optional[asyncio.Task] = None
+        try:
+            for _ in range(max_events):
+                next_result = asyncio.create_task(results.get())
+                # The reader and workers only return by raising (e.g. the socket
+                # closed), which is propagated to the caller.
+                done_tasks, _ = await asyncio.wait(
+                    [next_result, *tasks], return_when=asyncio.FIRST_COMPLETED
+                )
+                if next_result not in done_tasks:
+                    next_result.cancel()
+                    for task in done_tasks:
+                        task.result()
 
+                for ch in next_result.result():
+                    _LOG.info(
+                        "%s: %s %.9f SOL (%s)", ch.account, ch.direction, abs(ch.delta_SOL), ch.reason
+                    )
+                    yield ch
+        finally:
+            # Also covers a ``results.get()`` still pending when the consumer
+            # is cancelled inside ``asyncio.wait``.
+            if next_result is not None:
+                tasks.append(next_result)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
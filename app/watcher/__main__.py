@@ -1,20 +1,34 @@
 import argparse
 import asyncio
+from contextlib import aclosing
 from . import monitor_solana
 
+try:
+    import uvloop
+except ImportError:  # uvloop is optional and not available on Windows
+    uvloop = None
+
+
+async def _print_changes(max_events: int, threshold_SOL: float, skip_failed: bool) -> None:
+    changes = monitor_solana(max_events=max_events, threshold_SOL=threshold_SOL, skip_failed=skip_failed)
+    async with aclosing(changes):
+        async for r in changes:
+            print(r)
+
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Monitor Solana transactions")
     parser.add_argument("--max-events", type=int, default=5, help="number of events to collect")
     parser.add_argument("--threshold-sol", type=float, default=0.001, help="minimum SOL delta to display")
+    parser.add_argument(
+        "--skip-failed", action="store_true", help="ignore failed transactions (they only pay the fee)"
+    )
     args = parser.parse_args()
 
-    results = asyncio.run(
-        monitor_solana(max_events=args.max_events, threshold_SOL=args.threshold_sol)
-    )
-    print("FINAL RESULTS:")
-    for r in results:
-        print(r)
+    run = uvloop.run if uvloop is not None else asyncio.run
+    run(_print_changes(
+        max_events=args.max_events, threshold_SOL=args.threshold_sol, skip_failed=args.skip_failed
+    ))
 
 
 if __name__ == "__main__":